@@ -7,15 +7,18 @@ import asyncio
 import os
 import random
 import time
-import uuid
+import zlib
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime
+from os import urandom
 from typing import Optional
 
+import orjson
 import structlog
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from opentelemetry import trace
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.exporter.prometheus import PrometheusMetricReader
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
@@ -24,12 +27,19 @@ from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.semconv.resource import ResourceAttributes
 from opentelemetry.semconv.trace import SpanAttributes
 from opentelemetry.metrics import get_meter
 import httpx
 from pydantic import BaseModel
 
+
+def _orjson_dumps(value, **kwargs):
+    """Serialize log events with orjson, keeping structlog's fallback handler"""
+    return orjson.dumps(value, default=kwargs.get("default")).decode()
+
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -41,7 +51,7 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
@@ -49,7 +59,11 @@ structlog.configure(
     cache_logger_on_first_use=True,
 )
 
-logger = structlog.get_logger(__name__)
+# Bind once at import so request handlers reuse the same logger instance
+logger = structlog.get_logger(__name__).bind(service="payment-service")
+# Bound methods for the per-request log calls
+_info = logger.info
+_warning = logger.warning
 
 # Pydantic models
 class PaymentRequest(BaseModel):
@@ -78,14 +92,67 @@ class PaymentStatus(BaseModel):
 
 # Global variables for failure simulation
 FAILURE_RATE = float(os.getenv("PAYMENT_FAILURE_RATE", "0.1"))  # 10% failure rate by default
-LATENCY_SIMULATION = os.getenv("PAYMENT_LATENCY", "normal")  # normal, high, extreme
+LATENCY_SIMULATION = os.getenv("PAYMENT_LATENCY", "normal")  # normal, high, extreme, off
 SERVICE_DOWN = os.getenv("PAYMENT_SERVICE_DOWN", "false").lower() == "true"
+# Cap on stored payments; at least 1 so a new payment is never evicted on insert
+PAYMENTS_MAX = max(1, int(os.getenv("PAYMENTS_MAX", "100000")))
+OTEL_FULL_ATTRS = os.getenv("OTEL_FULL_ATTRS") == "1"  # keep raw ids on spans
+
+# Simulation constants, built once instead of per request
+_FAILURE_REASONS = (
+    "Insufficient funds",
+    "Card declined",
+    "Invalid card number",
+    "Expired card",
+    "Network timeout",
+    "Bank processing error",
+)
+_LATENCY_RANGES = {
+    "normal": (0.5, 2),
+    "high": (2, 5),
+    "extreme": (5, 10),
+    "off": None,  # no simulated delay, for benchmarking
+}
+
+# Dedicated RNG with its bound methods looked up once
+_rng = random.Random()
+_rand = _rng.random
+_uniform = _rng.uniform
+_rand_choice = _rng.choice
+
+
+def _safe_attr(span, key, value):
+    """Set a high-cardinality span attribute, reduced to a 16-bit hash
+    unless OTEL_FULL_ATTRS=1"""
+    if not span.is_recording():
+        return
+    if OTEL_FULL_ATTRS:
+        span.set_attribute(key, value)
+    else:
+        # crc32 rather than hash() so values match across processes
+        span.set_attribute(key, zlib.crc32(str(value).encode()) & 0xFFFF)
+
+
+def _redact_server_span(span, _request=None):
+    """Instrumentation request hook: replace the raw request path in
+    http.target/http.url with the route template unless OTEL_FULL_ATTRS=1"""
+    if OTEL_FULL_ATTRS or not span.is_recording():
+        return
+    attributes = span.attributes or {}
+    route = attributes.get(SpanAttributes.HTTP_ROUTE, "[redacted]")
+    span.set_attribute(SpanAttributes.HTTP_TARGET, route)
+    if SpanAttributes.HTTP_URL in attributes:
+        span.set_attribute(
+            SpanAttributes.HTTP_URL,
+            f"{attributes.get(SpanAttributes.HTTP_SCHEME, 'http')}://"
+            f"{attributes.get(SpanAttributes.HTTP_HOST, '')}{route}")
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Payment Service",
     description="Payment processing service with failure simulation for SRE training",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # OpenTelemetry setup
@@ -99,18 +166,27 @@ def setup_telemetry():
         ResourceAttributes.DEPLOYMENT_ENVIRONMENT: os.getenv("ENVIRONMENT", "development")
     })
     
-    # Setup tracing
-    trace.set_tracer_provider(TracerProvider(resource=resource))
+    # Setup tracing with head-based sampling (follows the parent's decision)
+    sampler = ParentBased(TraceIdRatioBased(
+        float(os.getenv("OTEL_SAMPLING_RATIO", "0.1"))))
+    trace.set_tracer_provider(TracerProvider(resource=resource, sampler=sampler))
     tracer = trace.get_tracer(__name__)
     
-    # Jaeger exporter for distributed tracing
-    jaeger_exporter = JaegerExporter(
-        agent_host_name=os.getenv("JAEGER_AGENT_HOST", "localhost"),
-        agent_port=int(os.getenv("JAEGER_AGENT_PORT", "14268")),
+    # OTLP/gRPC exporter for distributed tracing (Jaeger accepts OTLP natively)
+    otlp_exporter = OTLPSpanExporter(
+        endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "localhost:4317"),
+        insecure=True,
     )
     
     # Batch span processor for efficient export
-    span_processor = BatchSpanProcessor(jaeger_exporter)
+    span_processor = BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+        schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        max_export_batch_size=int(
+            os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+        export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+    )
     trace.get_tracer_provider().add_span_processor(span_processor)
     
     # Setup metrics
@@ -118,7 +194,8 @@ def setup_telemetry():
     meter_provider = MeterProvider(resource=resource, metric_readers=[prometheus_reader])
     
     # Instrument FastAPI and HTTP client
-    FastAPIInstrumentor.instrument_app(app)
+    FastAPIInstrumentor.instrument_app(
+        app, server_request_hook=_redact_server_span)
     HTTPXClientInstrumentor().instrument()
     
     return tracer, get_meter(__name__)
@@ -151,8 +228,103 @@ payment_amount = meter.create_histogram(
     unit="USD"
 )
 
+
+class MetricsBuffer:
+    """Queue metric updates on the request path and flush them periodically"""
+
+    COUNTER = "counter"
+    HISTOGRAM = "histogram"
+
+    def __init__(self, instruments, interval: float = 0.5, max_pending: int = 10000):
+        # instruments maps name -> (kind, instrument), kind being COUNTER or HISTOGRAM
+        self._instruments = instruments
+        self._interval = interval
+        self._max_pending = max_pending
+        self._pending = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, labels: dict, value: float):
+        """Buffer a counter increment or histogram observation"""
+        self._pending.append((name, labels, value))
+        # Flush inline if the background task is not keeping up (or not running)
+        if len(self._pending) >= self._max_pending:
+            self.flush()
+
+    def flush(self):
+        """Drain the buffer into the real OpenTelemetry instruments"""
+        counter_totals = {}
+        pending = self._pending
+        while pending:
+            name, labels, value = pending.popleft()
+            kind, instrument = self._instruments[name]
+            if kind == self.HISTOGRAM:
+                # Histograms need every observation to keep the distribution
+                instrument.record(value, labels)
+            else:
+                key = (name, tuple(sorted(labels.items())))
+                counter_totals[key] = counter_totals.get(key, 0) + value
+
+        # One add() per (counter, label set) instead of one per request
+        for (name, labels), total in counter_totals.items():
+            self._instruments[name][1].add(total, dict(labels))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.flush()
+            except Exception:
+                # Keep the flusher alive; a dead task would let the buffer grow
+                logger.exception("Metrics flush failed")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+
+metrics_buf = MetricsBuffer(
+    {
+        "payment_requests": (MetricsBuffer.COUNTER, payment_requests),
+        "payment_duration": (MetricsBuffer.HISTOGRAM, payment_duration),
+        "payment_failures": (MetricsBuffer.COUNTER, payment_failures),
+        "payment_amount": (MetricsBuffer.HISTOGRAM, payment_amount),
+    },
+    interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "0.5")),
+    max_pending=int(os.getenv("METRICS_MAX_PENDING", "10000")),
+)
+
 # In-memory storage for demo (in production, use a database)
-payments_db = {}
+# Bounded to PAYMENTS_MAX entries; the oldest payments are evicted first
+payments_db: OrderedDict[str, PaymentResponse] = OrderedDict()
+_store_payment = payments_db.__setitem__
+
+# Secondary indices so list_payments avoids scanning every stored payment.
+# Keyed by order_id to match the existing user_id filter proxy.
+payments_by_status: dict[str, deque[PaymentResponse]] = defaultdict(deque)
+payments_by_user: dict[str, deque[PaymentResponse]] = defaultdict(deque)
+
+
+def _evict_oldest_payments():
+    """Drop the oldest payments until the store is within PAYMENTS_MAX"""
+    while len(payments_db) > PAYMENTS_MAX:
+        _, evicted = payments_db.popitem(last=False)
+        # Indices are filled in insertion order, so the evicted payment is
+        # always at the front of its index entries
+        for index, key in ((payments_by_status, evicted.status),
+                           (payments_by_user, evicted.order_id)):
+            entries = index[key]
+            entries.popleft()
+            if not entries:
+                del index[key]
 
 # Simulate payment processing with various failure scenarios
 async def simulate_payment_processing(payment_request: PaymentRequest) -> PaymentResponse:
@@ -162,74 +334,64 @@ async def simulate_payment_processing(payment_request: PaymentRequest) -> Paymen
         start_time = time.time()
         
         # Add span attributes
-        span.set_attribute("payment.order_id", payment_request.order_id)
-        span.set_attribute("payment.user_id", payment_request.user_id)
+        _safe_attr(span, "payment.order_id", payment_request.order_id)
+        _safe_attr(span, "payment.user_id", payment_request.user_id)
         span.set_attribute("payment.amount", payment_request.amount)
         span.set_attribute("payment.method", payment_request.payment_method)
         
-        # Simulate different latency scenarios
-        if LATENCY_SIMULATION == "high":
-            delay = random.uniform(2, 5)
-        elif LATENCY_SIMULATION == "extreme":
-            delay = random.uniform(5, 10)
-        else:  # normal
-            delay = random.uniform(0.5, 2)
-        
-        span.set_attribute("simulation.delay", delay)
-        await asyncio.sleep(delay)
+        # Simulate different latency scenarios (unknown modes fall back to normal)
+        latency_range = _LATENCY_RANGES.get(LATENCY_SIMULATION, _LATENCY_RANGES["normal"])
+        if latency_range:
+            delay = _uniform(*latency_range)
+            span.set_attribute("simulation.delay", delay)
+            await asyncio.sleep(delay)
         
         # Simulate service down scenario
         if SERVICE_DOWN:
             span.set_attribute("error.type", "service_down")
             raise HTTPException(status_code=503, detail="Payment service is temporarily unavailable")
         
+        # Single wall-clock read shared by the failure and success outcomes
+        processed_at = datetime.now()
+        
         # Simulate random failures
-        if random.random() < FAILURE_RATE:
-            failure_reasons = [
-                "Insufficient funds",
-                "Card declined",
-                "Invalid card number",
-                "Expired card",
-                "Network timeout",
-                "Bank processing error"
-            ]
-            failure_reason = random.choice(failure_reasons)
+        if _rand() < FAILURE_RATE:
+            failure_reason = _rand_choice(_FAILURE_REASONS)
             
             span.set_attribute("error.type", "payment_failed")
             span.set_attribute("error.reason", failure_reason)
             
-            payment_failures.add(1, {"reason": failure_reason})
+            metrics_buf.add("payment_failures", {"reason": failure_reason}, 1)
             
-            logger.warning("Payment failed", 
-                         order_id=payment_request.order_id,
-                         amount=payment_request.amount,
-                         reason=failure_reason)
+            _warning("Payment failed", 
+                     order_id=payment_request.order_id,
+                     amount=payment_request.amount,
+                     reason=failure_reason)
             
             return PaymentResponse(
-                payment_id=str(uuid.uuid4()),
+                payment_id=urandom(16).hex(),
                 order_id=payment_request.order_id,
                 status="failed",
                 amount=payment_request.amount,
-                processed_at=datetime.now(),
+                processed_at=processed_at,
                 failure_reason=failure_reason
             )
         
         # Simulate successful payment
-        payment_id = str(uuid.uuid4())
-        processed_at = datetime.now()
+        payment_id = urandom(16).hex()
         
         # Record metrics
-        payment_requests.add(1, {"status": "success"})
-        payment_duration.record(time.time() - start_time, {"status": "success"})
-        payment_amount.record(payment_request.amount, {"status": "success"})
+        metrics_buf.add("payment_requests", {"status": "success"}, 1)
+        metrics_buf.add("payment_duration", {"status": "success"}, time.time() - start_time)
+        metrics_buf.add("payment_amount", {"status": "success"}, payment_request.amount)
         
-        span.set_attribute("payment.id", payment_id)
+        _safe_attr(span, "payment.id", payment_id)
         span.set_attribute("payment.status", "success")
         
-        logger.info("Payment processed successfully",
-                   payment_id=payment_id,
-                   order_id=payment_request.order_id,
-                   amount=payment_request.amount)
+        _info("Payment processed successfully",
+              payment_id=payment_id,
+              order_id=payment_request.order_id,
+              amount=payment_request.amount)
         
         return PaymentResponse(
             payment_id=payment_id,
@@ -265,90 +427,103 @@ async def health_check():
 @app.post("/payments", response_model=PaymentResponse)
 async def create_payment(payment_request: PaymentRequest):
     """Process a payment request"""
-    with tracer.start_as_current_span("create_payment") as span:
-        start_time = time.time()
+    span = trace.get_current_span()
+    start_time = time.time()
+    
+    try:
+        # Validate payment request
+        if payment_request.amount <= 0:
+            raise HTTPException(status_code=400, detail="Amount must be positive")
         
-        try:
-            # Validate payment request
-            if payment_request.amount <= 0:
-                raise HTTPException(status_code=400, detail="Amount must be positive")
-            
-            if payment_request.amount > 10000:  # Simulate high-value transaction limits
-                span.set_attribute("error.type", "amount_too_high")
-                raise HTTPException(status_code=400, detail="Amount exceeds maximum limit")
-            
-            # Process payment
-            payment_response = await simulate_payment_processing(payment_request)
-            
-            # Store in memory database
-            payments_db[payment_response.payment_id] = payment_response
-            
-            # Record metrics
-            payment_requests.add(1, {"method": "POST", "endpoint": "/payments"})
-            payment_duration.record(time.time() - start_time, {"method": "POST", "endpoint": "/payments"})
-            
-            return payment_response
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            span.record_exception(e)
-            logger.error("Payment processing failed", error=str(e))
-            raise HTTPException(status_code=500, detail="Internal server error")
-
-@app.get("/payments/{payment_id}", response_model=PaymentStatus)
-async def get_payment_status(payment_id: str):
-    """Get payment status by ID"""
-    with tracer.start_as_current_span("get_payment_status") as span:
-        span.set_attribute("payment.id", payment_id)
+        if payment_request.amount > 10000:  # Simulate high-value transaction limits
+            span.set_attribute("error.type", "amount_too_high")
+            raise HTTPException(status_code=400, detail="Amount exceeds maximum limit")
         
-        if payment_id not in payments_db:
-            span.set_attribute("error.type", "not_found")
-            raise HTTPException(status_code=404, detail="Payment not found")
+        # Process payment
+        payment_response = await simulate_payment_processing(payment_request)
         
-        payment = payments_db[payment_id]
+        # Store in memory database
+        _store_payment(payment_response.payment_id, payment_response)
+        payments_by_status[payment_response.status].append(payment_response)
+        payments_by_user[payment_response.order_id].append(payment_response)
+        _evict_oldest_payments()
         
-        logger.info("Retrieved payment status", payment_id=payment_id, status=payment.status)
+        # Record metrics
+        metrics_buf.add("payment_requests", {"method": "POST", "endpoint": "/payments"}, 1)
+        metrics_buf.add("payment_duration", {"method": "POST", "endpoint": "/payments"}, time.time() - start_time)
         
-        return PaymentStatus(
-            payment_id=payment.payment_id,
-            status=payment.status,
-            amount=payment.amount,
-            processed_at=payment.processed_at,
-            failure_reason=payment.failure_reason
-        )
+        return payment_response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        span.record_exception(e)
+        logger.error("Payment processing failed", error=str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/payments/{payment_id}", response_model=PaymentStatus)
+async def get_payment_status(payment_id: str):
+    """Get payment status by ID"""
+    span = trace.get_current_span()
+    _safe_attr(span, "payment.id", payment_id)
+    
+    if payment_id not in payments_db:
+        span.set_attribute("error.type", "not_found")
+        raise HTTPException(status_code=404, detail="Payment not found")
+    
+    payment = payments_db[payment_id]
+    
+    _info("Retrieved payment status", payment_id=payment_id, status=payment.status)
+    
+    return PaymentStatus(
+        payment_id=payment.payment_id,
+        status=payment.status,
+        amount=payment.amount,
+        processed_at=payment.processed_at,
+        failure_reason=payment.failure_reason
+    )
 
 @app.get("/payments")
 async def list_payments(user_id: Optional[str] = None, status: Optional[str] = None):
     """List payments with optional filtering"""
-    with tracer.start_as_current_span("list_payments") as span:
-        span.set_attribute("filter.user_id", user_id or "all")
-        span.set_attribute("filter.status", status or "all")
-        
-        filtered_payments = []
-        for payment in payments_db.values():
-            # Apply filters
-            if user_id and payment.order_id != user_id:  # Note: using order_id as proxy for user_id
-                continue
-            if status and payment.status != status:
-                continue
-            filtered_payments.append(payment)
-        
-        span.set_attribute("payments.count", len(filtered_payments))
-        
-        logger.info("Listed payments", 
-                   count=len(filtered_payments),
-                   user_id=user_id,
-                   status=status)
-        
-        return {
-            "payments": filtered_payments,
-            "total": len(filtered_payments),
-            "filters": {
-                "user_id": user_id,
-                "status": status
-            }
+    span = trace.get_current_span()
+    if user_id:
+        _safe_attr(span, "filter.user_id", user_id)
+    else:
+        span.set_attribute("filter.user_id", "all")
+    span.set_attribute("filter.status", status or "all")
+    
+    # Apply filters via the secondary indices, walking the smaller one
+    # Note: using order_id as proxy for user_id
+    if user_id and status:
+        by_user = payments_by_user.get(user_id, [])
+        by_status = payments_by_status.get(status, [])
+        if len(by_user) <= len(by_status):
+            filtered_payments = [p for p in by_user if p.status == status]
+        else:
+            filtered_payments = [p for p in by_status if p.order_id == user_id]
+    elif user_id:
+        filtered_payments = list(payments_by_user.get(user_id, []))
+    elif status:
+        filtered_payments = list(payments_by_status.get(status, []))
+    else:
+        filtered_payments = list(payments_db.values())
+    
+    span.set_attribute("payments.count", len(filtered_payments))
+    
+    _info("Listed payments", 
+          count=len(filtered_payments),
+          user_id=user_id,
+          status=status)
+    
+    return {
+        "payments": filtered_payments,
+        "total": len(filtered_payments),
+        "filters": {
+            "user_id": user_id,
+            "status": status
         }
+    }
 
 # Incident simulation endpoints for SRE training
 @app.post("/simulate/failure")
@@ -429,11 +604,18 @@ async def set_failure_rate(rate: float):
 @app.on_event("startup")
 async def startup_event():
     """Initialize service on startup"""
+    metrics_buf.start()
     logger.info("Payment Service starting up",
                failure_rate=FAILURE_RATE,
                latency_simulation=LATENCY_SIMULATION,
                service_down=SERVICE_DOWN)
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered metrics before the service exits"""
+    await metrics_buf.stop()
+
 if __name__ == "__main__":
     import uvicorn
     
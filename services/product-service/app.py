@@ -5,17 +5,20 @@ Demonstrates OpenTelemetry instrumentation, metrics, and distributed tracing
 
 import os
 import logging
+import orjson
 import structlog
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert, text
 from opentelemetry import trace
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
 from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
 from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.exporter.prometheus import PrometheusMetricReader
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk.resources import Resource
@@ -25,6 +28,12 @@ from opentelemetry.metrics import get_meter
 import time
 import random
 
+
+def _orjson_dumps(value, **kwargs):
+    """Serialize log events with orjson, keeping structlog's fallback handler"""
+    return orjson.dumps(value, default=kwargs.get("default")).decode()
+
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -36,7 +45,7 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
@@ -44,17 +53,31 @@ structlog.configure(
     cache_logger_on_first_use=True,
 )
 
-logger = structlog.get_logger(__name__)
+# Bind once at import so request handlers reuse the same logger instance
+logger = structlog.get_logger(__name__).bind(service="product-service")
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
     'DATABASE_URL', 'sqlite:///:memory:')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool sized for gunicorn gthread workers; SQLite uses its own single-connection pool
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '20')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_pre_ping': True,
+    }
 
 # Initialize database
 db = SQLAlchemy(app)
 
+
+def orjson_response(data):
+    """Build a JSON response with orjson instead of Flask's stdlib encoder"""
+    return app.response_class(orjson.dumps(data), mimetype='application/json')
+
+
 # Product model
 
 
@@ -67,6 +90,11 @@ class Product(db.Model):
     category = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
+    # Category filter + id ordering for product listing (created by db.create_all())
+    __table_args__ = (
+        db.Index('ix_product_category_id', 'category', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -78,6 +106,18 @@ class Product(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+# Columns returned by the product listing, in to_dict() order
+_PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.stock_quantity,
+    Product.category,
+    Product.created_at,
+)
+
 # OpenTelemetry setup
 
 
@@ -92,18 +132,27 @@ def setup_telemetry():
             "ENVIRONMENT", "development")
     })
 
-    # Setup tracing
-    trace.set_tracer_provider(TracerProvider(resource=resource))
+    # Setup tracing with head-based sampling (follows the parent's decision)
+    sampler = ParentBased(TraceIdRatioBased(
+        float(os.getenv("OTEL_SAMPLING_RATIO", "0.1"))))
+    trace.set_tracer_provider(TracerProvider(resource=resource, sampler=sampler))
     tracer = trace.get_tracer(__name__)
 
-    # Jaeger exporter for distributed tracing
-    jaeger_exporter = JaegerExporter(
-        agent_host_name=os.getenv("JAEGER_AGENT_HOST", "localhost"),
-        agent_port=int(os.getenv("JAEGER_AGENT_PORT", "14268")),
+    # OTLP/gRPC exporter for distributed tracing (Jaeger accepts OTLP natively)
+    otlp_exporter = OTLPSpanExporter(
+        endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "localhost:4317"),
+        insecure=True,
     )
 
     # Batch span processor for efficient export
-    span_processor = BatchSpanProcessor(jaeger_exporter)
+    span_processor = BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+        schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        max_export_batch_size=int(
+            os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+        export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+    )
     trace.get_tracer_provider().add_span_processor(span_processor)
 
     # Setup metrics
@@ -112,14 +161,13 @@ def setup_telemetry():
         resource=resource, metric_readers=[prometheus_reader])
 
     # Instrument Flask (SQLAlchemy will be instrumented after app context is available)
-    FlaskInstrumentor().instrument_app(app)
+    FlaskInstrumentor().instrument_app(app, request_hook=_redact_server_span)
     RequestsInstrumentor().instrument()
 
     return tracer, get_meter(__name__)
 
 
-# Initialize telemetry (will be called after app is created)
-tracer = None
+# Initialize telemetry (set up at the bottom of the module, per worker)
 meter = None
 
 # Custom metrics (will be initialized after telemetry setup)
@@ -127,6 +175,38 @@ request_counter = None
 request_duration = None
 products_in_stock = None
 
+# Keep full-cardinality values (raw URLs) on spans only when asked to
+OTEL_FULL_ATTRS = os.getenv("OTEL_FULL_ATTRS") == "1"
+
+# Dedicated RNG for latency simulation, bound once
+_uniform = random.Random().uniform
+
+# Page size for /products when no limit is given
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Upper bound on products accepted by one /products/batch request
+MAX_BATCH_SIZE = int(os.getenv('PRODUCT_BATCH_MAX', '500'))
+
+# Reused by every health probe instead of rebuilding the statement
+_HEALTH_STMT = text('SELECT 1')
+
+
+def _redact_server_span(span, _request=None):
+    """Instrumentation request hook: replace the raw request path in
+    http.target/http.url with the route template unless OTEL_FULL_ATTRS=1"""
+    if OTEL_FULL_ATTRS or not span.is_recording():
+        return
+    attributes = span.attributes or {}
+    route = attributes.get(SpanAttributes.HTTP_ROUTE, "[redacted]")
+    span.set_attribute(SpanAttributes.HTTP_TARGET, route)
+    if SpanAttributes.HTTP_URL in attributes:
+        span.set_attribute(
+            SpanAttributes.HTTP_URL,
+            f"{attributes.get(SpanAttributes.HTTP_SCHEME, 'http')}://"
+            f"{attributes.get(SpanAttributes.HTTP_HOST, '')}{route}")
+
+
 # Health check endpoint
 
 
@@ -134,10 +214,10 @@ products_in_stock = None
 def health_check():
     """Health check endpoint for Kubernetes liveness/readiness probes"""
     try:
-        # Check database connectivity
-        from sqlalchemy import text
-        db.session.execute(text('SELECT 1'))
-        return jsonify({
+        # Check database connectivity on a pooled connection, bypassing the ORM session
+        with db.engine.connect() as conn:
+            conn.execute(_HEALTH_STMT)
+        return orjson_response({
             'status': 'healthy',
             'service': 'product-service',
             'version': '1.0.0',
@@ -145,7 +225,7 @@ def health_check():
         }), 200
     except Exception as e:
         logger.error("Health check failed", error=str(e))
-        return jsonify({
+        return orjson_response({
             'status': 'unhealthy',
             'service': 'product-service',
             'error': str(e)
@@ -157,59 +237,77 @@ def health_check():
 @app.route('/products', methods=['GET'])
 def get_products():
     """Get all products with optional filtering"""
-    with tracer.start_as_current_span("get_products") as span:
-        start_time = time.time()
-
-        try:
-            # Add span attributes
-            span.set_attribute("http.method", "GET")
-            span.set_attribute("http.url", request.url)
-            span.set_attribute("service.name", "product-service")
-
-            # Parse query parameters
-            category = request.args.get('category')
-            limit = request.args.get('limit', type=int)
-            offset = request.args.get('offset', 0, type=int)
-
-            # Build query
-            query = Product.query
-            if category:
-                query = query.filter(Product.category == category)
-                span.set_attribute("filter.category", category)
-
-            if limit:
-                query = query.limit(limit)
-                span.set_attribute("filter.limit", limit)
-
-            query = query.offset(offset)
-
-            # Execute query
-            products = query.all()
-
-            # Record metrics
-            request_counter.add(1, {"method": "GET", "endpoint": "/products"})
-            request_duration.record(
-                time.time() - start_time, {"method": "GET", "endpoint": "/products"})
-
-            # Log with trace context
-            logger.info("Retrieved products",
-                        count=len(products),
-                        category=category,
-                        limit=limit,
-                        offset=offset)
-
-            return jsonify({
-                'products': [product.to_dict() for product in products],
-                'total': len(products),
-                'category': category,
-                'limit': limit,
-                'offset': offset
-            }), 200
-
-        except Exception as e:
-            span.record_exception(e)
-            logger.error("Failed to retrieve products", error=str(e))
-            return jsonify({'error': 'Failed to retrieve products'}), 500
+    span = trace.get_current_span()
+    start_time = time.time()
+
+    try:
+        # Add span attributes
+        span.set_attribute("http.method", "GET")
+        span.set_attribute("service.name", "product-service")
+
+        # Parse query parameters
+        category = request.args.get('category')
+        if 'offset' in request.args:
+            return orjson_response({'error': 'offset is no longer supported; '
+                                             'page with after=<next_cursor>'}), 400
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        after_id = request.args.get('after', type=int)
+        with_count = request.args.get('count', 'false').lower() == 'true'
+
+        # Build query over plain columns; rows skip ORM instance hydration
+        # and orjson serializes created_at natively
+        query = db.session.query(*_PRODUCT_COLUMNS)
+        if category:
+            query = query.filter(Product.category == category)
+            span.set_attribute("filter.category", category)
+
+        # Full match count is an extra query, so only run it on request
+        total_count = query.count() if with_count else None
+
+        # Keyset pagination: seek past the cursor on the primary key index
+        # rather than scanning and discarding OFFSET rows
+        if after_id:
+            query = query.filter(Product.id > after_id)
+            span.set_attribute("filter.after", after_id)
+
+        query = query.order_by(Product.id).limit(limit)
+        span.set_attribute("filter.limit", limit)
+
+        # Pages are capped by limit, so the rows are simply collected
+        products = [row._asdict() for row in query]
+        # A full page means there may be more rows after the last id
+        next_cursor = products[-1]['id'] if len(products) == limit else None
+
+        # Record metrics
+        request_counter.add(1, {"method": "GET", "endpoint": "/products"})
+        request_duration.record(
+            time.time() - start_time, {"method": "GET", "endpoint": "/products"})
+
+        # Log with trace context
+        logger.info("Retrieved products",
+                    count=len(products),
+                    category=category,
+                    limit=limit,
+                    after=after_id)
+
+        payload = {
+            'products': products,
+            'total': len(products),
+            'category': category,
+            'limit': limit,
+            'after': after_id,
+            'next_cursor': next_cursor
+        }
+        if with_count:
+            payload['total_count'] = total_count
+
+        return orjson_response(payload), 200
+
+    except Exception as e:
+        span.record_exception(e)
+        logger.error("Failed to retrieve products", error=str(e))
+        return orjson_response({'error': 'Failed to retrieve products'}), 500
 
 # Get product by ID
 
@@ -217,32 +315,31 @@ def get_products():
 @app.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     """Get a specific product by ID"""
-    with tracer.start_as_current_span("get_product") as span:
-        start_time = time.time()
+    span = trace.get_current_span()
+    start_time = time.time()
 
-        try:
-            span.set_attribute("product.id", product_id)
-            span.set_attribute("http.method", "GET")
-            span.set_attribute("http.url", request.url)
+    try:
+        span.set_attribute("product.id", product_id)
+        span.set_attribute("http.method", "GET")
 
-            product = Product.query.get_or_404(product_id)
+        product = Product.query.get_or_404(product_id)
 
-            # Record metrics
-            request_counter.add(
-                1, {"method": "GET", "endpoint": "/products/{id}"})
-            request_duration.record(
-                time.time() - start_time, {"method": "GET", "endpoint": "/products/{id}"})
+        # Record metrics
+        request_counter.add(
+            1, {"method": "GET", "endpoint": "/products/{id}"})
+        request_duration.record(
+            time.time() - start_time, {"method": "GET", "endpoint": "/products/{id}"})
 
-            logger.info("Retrieved product", product_id=product_id,
-                        product_name=product.name)
+        logger.info("Retrieved product", product_id=product_id,
+                    product_name=product.name)
 
-            return jsonify(product.to_dict()), 200
+        return orjson_response(product.to_dict()), 200
 
-        except Exception as e:
-            span.record_exception(e)
-            logger.error("Failed to retrieve product",
-                         product_id=product_id, error=str(e))
-            return jsonify({'error': 'Product not found'}), 404
+    except Exception as e:
+        span.record_exception(e)
+        logger.error("Failed to retrieve product",
+                     product_id=product_id, error=str(e))
+        return orjson_response({'error': 'Product not found'}), 404
 
 # Create new product
 
@@ -250,51 +347,122 @@ def get_product(product_id):
 @app.route('/products', methods=['POST'])
 def create_product():
     """Create a new product"""
-    with tracer.start_as_current_span("create_product") as span:
-        start_time = time.time()
+    span = trace.get_current_span()
+    start_time = time.time()
+
+    try:
+        data = request.get_json()
+
+        # Validate required fields
+        required_fields = ['name', 'price']
+        for field in required_fields:
+            if field not in data:
+                return orjson_response({'error': f'Missing required field: {field}'}), 400
+
+        # Create product
+        product = Product(
+            name=data['name'],
+            description=data.get('description', ''),
+            price=data['price'],
+            stock_quantity=data.get('stock_quantity', 0),
+            category=data.get('category', 'uncategorized')
+        )
+
+        db.session.add(product)
+        db.session.commit()
+
+        # Update metrics
+        products_in_stock.add(product.stock_quantity)
+
+        # Record metrics
+        request_counter.add(1, {"method": "POST", "endpoint": "/products"})
+        request_duration.record(
+            time.time() - start_time, {"method": "POST", "endpoint": "/products"})
+
+        logger.info("Created product",
+                    product_id=product.id,
+                    product_name=product.name,
+                    price=product.price,
+                    stock=product.stock_quantity)
+
+        return orjson_response(product.to_dict()), 201
+
+    except Exception as e:
+        db.session.rollback()
+        span.record_exception(e)
+        logger.error("Failed to create product", error=str(e))
+        return orjson_response({'error': 'Failed to create product'}), 500
+
+# Create products in bulk
 
-        try:
-            data = request.get_json()
 
-            # Validate required fields
-            required_fields = ['name', 'price']
+@app.route('/products/batch', methods=['POST'])
+def create_products_batch():
+    """Create several products in a single transaction"""
+    span = trace.get_current_span()
+    start_time = time.time()
+
+    try:
+        items = request.get_json()
+
+        if not isinstance(items, list) or not items:
+            return orjson_response({'error': 'Expected a non-empty list of products'}), 400
+
+        if len(items) > MAX_BATCH_SIZE:
+            return orjson_response({'error': f'Batch exceeds maximum size of {MAX_BATCH_SIZE}'}), 400
+
+        # Validate required fields on every item before touching the session
+        required_fields = ['name', 'price']
+        for index, data in enumerate(items):
+            if not isinstance(data, dict):
+                return orjson_response({'error': 'Each product must be an object',
+                                        'index': index}), 400
             for field in required_fields:
                 if field not in data:
-                    return jsonify({'error': f'Missing required field: {field}'}), 400
+                    return orjson_response({'error': f'Missing required field: {field}',
+                                            'index': index}), 400
+
+        rows = [
+            {
+                'name': data['name'],
+                'description': data.get('description', ''),
+                'price': data['price'],
+                'stock_quantity': data.get('stock_quantity', 0),
+                'category': data.get('category', 'uncategorized'),
+            }
+            for data in items
+        ]
 
-            # Create product
-            product = Product(
-                name=data['name'],
-                description=data.get('description', ''),
-                price=data['price'],
-                stock_quantity=data.get('stock_quantity', 0),
-                category=data.get('category', 'uncategorized')
-            )
+        # Bulk INSERT ... RETURNING: SQLAlchemy batches the rows into
+        # multi-row statements and hands back the stored columns, so there
+        # is no per-row refresh after the single commit
+        result = db.session.execute(
+            insert(Product).returning(
+                *_PRODUCT_COLUMNS, sort_by_parameter_order=True),
+            rows)
+        products = [row._asdict() for row in result]
+        db.session.commit()
 
-            db.session.add(product)
-            db.session.commit()
+        span.set_attribute("batch.size", len(products))
 
-            # Update metrics
-            products_in_stock.add(product.stock_quantity)
+        # Update metrics
+        products_in_stock.add(sum(p['stock_quantity'] for p in products))
 
-            # Record metrics
-            request_counter.add(1, {"method": "POST", "endpoint": "/products"})
-            request_duration.record(
-                time.time() - start_time, {"method": "POST", "endpoint": "/products"})
+        # Record metrics
+        request_counter.add(
+            1, {"method": "POST", "endpoint": "/products/batch"})
+        request_duration.record(
+            time.time() - start_time, {"method": "POST", "endpoint": "/products/batch"})
 
-            logger.info("Created product",
-                        product_id=product.id,
-                        product_name=product.name,
-                        price=product.price,
-                        stock=product.stock_quantity)
+        logger.info("Created products in batch", count=len(products))
 
-            return jsonify(product.to_dict()), 201
+        return orjson_response(products), 201
 
-        except Exception as e:
-            db.session.rollback()
-            span.record_exception(e)
-            logger.error("Failed to create product", error=str(e))
-            return jsonify({'error': 'Failed to create product'}), 500
+    except Exception as e:
+        db.session.rollback()
+        span.record_exception(e)
+        logger.error("Failed to create products in batch", error=str(e))
+        return orjson_response({'error': 'Failed to create products'}), 500
 
 # Update product stock
 
@@ -302,43 +470,43 @@ def create_product():
 @app.route('/products/<int:product_id>/stock', methods=['PUT'])
 def update_stock(product_id):
     """Update product stock quantity"""
-    with tracer.start_as_current_span("update_stock") as span:
-        start_time = time.time()
+    span = trace.get_current_span()
+    start_time = time.time()
 
-        try:
-            data = request.get_json()
-            new_quantity = data.get('quantity')
+    try:
+        data = request.get_json()
+        new_quantity = data.get('quantity')
 
-            if new_quantity is None:
-                return jsonify({'error': 'Missing quantity field'}), 400
+        if new_quantity is None:
+            return orjson_response({'error': 'Missing quantity field'}), 400
 
-            product = Product.query.get_or_404(product_id)
-            old_quantity = product.stock_quantity
-            product.stock_quantity = new_quantity
-            db.session.commit()
+        product = Product.query.get_or_404(product_id)
+        old_quantity = product.stock_quantity
+        product.stock_quantity = new_quantity
+        db.session.commit()
 
-            # Update metrics
-            products_in_stock.add(new_quantity - old_quantity)
+        # Update metrics
+        products_in_stock.add(new_quantity - old_quantity)
 
-            # Record metrics
-            request_counter.add(
-                1, {"method": "PUT", "endpoint": "/products/{id}/stock"})
-            request_duration.record(
-                time.time() - start_time, {"method": "PUT", "endpoint": "/products/{id}/stock"})
+        # Record metrics
+        request_counter.add(
+            1, {"method": "PUT", "endpoint": "/products/{id}/stock"})
+        request_duration.record(
+            time.time() - start_time, {"method": "PUT", "endpoint": "/products/{id}/stock"})
 
-            logger.info("Updated product stock",
-                        product_id=product_id,
-                        old_quantity=old_quantity,
-                        new_quantity=new_quantity)
+        logger.info("Updated product stock",
+                    product_id=product_id,
+                    old_quantity=old_quantity,
+                    new_quantity=new_quantity)
 
-            return jsonify(product.to_dict()), 200
+        return orjson_response(product.to_dict()), 200
 
-        except Exception as e:
-            db.session.rollback()
-            span.record_exception(e)
-            logger.error("Failed to update stock",
-                         product_id=product_id, error=str(e))
-            return jsonify({'error': 'Failed to update stock'}), 500
+    except Exception as e:
+        db.session.rollback()
+        span.record_exception(e)
+        logger.error("Failed to update stock",
+                     product_id=product_id, error=str(e))
+        return orjson_response({'error': 'Failed to update stock'}), 500
 
 # Simulate some latency for testing
 
@@ -346,19 +514,19 @@ def update_stock(product_id):
 @app.route('/products/slow', methods=['GET'])
 def slow_products():
     """Simulate slow response for testing observability"""
-    with tracer.start_as_current_span("slow_products") as span:
-        # Simulate processing time
-        delay = random.uniform(1, 3)
-        time.sleep(delay)
-
-        span.set_attribute("simulated.delay", delay)
-        logger.warning("Slow endpoint accessed", delay=delay)
-
-        return jsonify({
-            'message': 'This is a slow endpoint for testing',
-            'delay': delay,
-            'products': []
-        }), 200
+    span = trace.get_current_span()
+    # Simulate processing time
+    delay = _uniform(1, 3)
+    time.sleep(delay)
+
+    span.set_attribute("simulated.delay", delay)
+    logger.warning("Slow endpoint accessed", delay=delay)
+
+    return orjson_response({
+        'message': 'This is a slow endpoint for testing',
+        'delay': delay,
+        'products': []
+    }), 200
 
 # Initialize database function
 
@@ -390,38 +558,34 @@ def create_tables():
                     count=len(sample_products))
 
 
-if __name__ == '__main__':
-    # Initialize telemetry after app is created
-    tracer, meter = setup_telemetry()
+# Initialize on import: gunicorn loads app:app in each worker (no --preload),
+# so every worker gets its own exporter threads and connection pool.
+# Handlers annotate the auto-instrumented server span, so no module tracer
+_, meter = setup_telemetry()
 
-    # Initialize metrics
-    request_counter = meter.create_counter(
-        name="product_service_requests_total",
-        description="Total number of requests to product service",
-        unit="1"
-    )
-
-    request_duration = meter.create_histogram(
-        name="product_service_request_duration_seconds",
-        description="Request duration in seconds",
-        unit="s"
-    )
+# Initialize metrics
+request_counter = meter.create_counter(
+    name="product_service_requests_total",
+    description="Total number of requests to product service",
+    unit="1"
+)
 
-    products_in_stock = meter.create_up_down_counter(
-        name="products_in_stock_total",
-        description="Total number of products in stock",
-        unit="1"
-    )
+request_duration = meter.create_histogram(
+    name="product_service_request_duration_seconds",
+    description="Request duration in seconds",
+    unit="s"
+)
 
-    # Create tables and seed data
-    with app.app_context():
-        # Now we can safely instrument SQLAlchemy
-        SQLAlchemyInstrumentor().instrument(engine=db.engine)
-        create_tables()
+products_in_stock = meter.create_up_down_counter(
+    name="products_in_stock_total",
+    description="Total number of products in stock",
+    unit="1"
+)
 
-    # Run the application
-    port = int(os.getenv('PORT', 5000))
-    debug = os.getenv('DEBUG', 'False').lower() == 'true'
+# Create tables and seed data
+with app.app_context():
+    # Now we can safely instrument SQLAlchemy
+    SQLAlchemyInstrumentor().instrument(engine=db.engine)
+    create_tables()
 
-    logger.info("Starting Product Service", port=port, debug=debug)
-    app.run(host='0.0.0.0', port=port, debug=debug)
+logger.info("Product Service initialized", pid=os.getpid())
@@ -0,0 +1,20 @@
+"""
+Gunicorn settings for the Product Service
+Worker counts can be overridden with GUNICORN_WORKERS / GUNICORN_THREADS
+"""
+
+import multiprocessing
+import os
+
+# SQLite databases (including the default sqlite:///:memory:) are created and
+# seeded per worker process, so a second worker would serve a different
+# catalog. Only fan out across CPUs when DATABASE_URL points at a shared
+# database server such as PostgreSQL.
+_database_url = os.getenv('DATABASE_URL', 'sqlite:///:memory:')
+_default_workers = 1 if _database_url.startswith(
+    'sqlite') else multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', _default_workers))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))